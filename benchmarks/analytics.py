@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""Compare the columnar analytics with iterating over ORM objects
+
+Usage: python -m benchmarks.analytics [messages]
+"""
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime, timedelta
+
+from hashdigestbot.analytics import MessageColumns, numpy
+from hashdigestbot.model.database import connect
+from hashdigestbot.model.entities import HashMessage, HashTag, HashUser
+
+
+def populate(url, count, tags=500, users=1000):
+    db = connect(url)
+    tag_list = [HashTag(id="tag%d" % i, shapes={"Tag%d" % i}) for i in range(tags)]
+    user_list = [HashUser(id=i, friendly_name="User %d" % i, username="user%d" % i) for i in range(1, users+1)]
+    start = datetime(2016, 1, 1)
+    messages = []
+    for i in range(1, count+1):
+        message = HashMessage(id=i, date=start + timedelta(minutes=i), text="message %d" % i, chat_id=1,
+                              reply_to=i-1 if i % 3 == 0 else None)
+        message.tag = tag_list[i % tags]
+        message.user = user_list[i % users]
+        messages.append(message)
+    db.insert_many(messages)
+
+
+def orm_analytics(url):
+    db = connect(url, backend='alchemy')
+    tags, users, days, tree = Counter(), Counter(), Counter(), {}
+    messages = db.query(HashMessage).filter_by(chat_id=1).all()
+    for message in messages:
+        tags[message.tag_id] += 1
+        users[message.user_id] += 1
+        days[message.date.date()] += 1
+        if message.reply_to:
+            tree.setdefault(message.reply_to, []).append(message.id)
+    return tags, users, sorted(days.items()), tree
+
+
+def columnar_analytics(url):
+    db = connect(url)
+    columns = MessageColumns.load(db, chat_id=1)
+    return columns.tag_counts(), columns.user_activity(), columns.date_histogram(), columns.reply_tree()
+
+
+def measure(func, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    func(*args)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak / 2**20
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, 'analytics.db')
+        populate('sqlite3:///' + path, count)
+
+        print("%d messages, numpy %s" % (count, numpy and numpy.__version__ or "not installed"))
+        print("%-20s %10s %12s" % ("engine", "time (s)", "peak (MB)"))
+        for name, func, url in (("orm", orm_analytics, 'sqlite:///' + path),
+                                ("columnar/alchemy", columnar_analytics, 'sqlite:///' + path),
+                                ("columnar/sqlite3", columnar_analytics, 'sqlite3:///' + path)):
+            elapsed, peak = measure(func, url)
+            print("%-20s %10.3f %12.1f" % (name, elapsed, peak))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""Compare the database backends on the digester ingest path
+
+Usage: python -m benchmarks.backends [messages]
+"""
+import sys
+import time
+from datetime import datetime
+
+import telegram
+
+from hashdigestbot.digester import Digester
+from hashdigestbot.model.entities import HashMessage, HashTag, HashUser
+
+URLS = (
+    ('alchemy', 'sqlite://'),
+    ('sqlite3', 'sqlite3://'),
+)
+
+
+def make_messages(count, chat_id=1, tags=50, users=20):
+    chat = telegram.Chat(id=chat_id, type="group")
+    senders = [telegram.User(id=i, first_name="User", last_name=str(i), username="user%d" % i)
+               for i in range(1, users+1)]
+    previous = None
+    for i in range(1, count+1):
+        sender = senders[i % users]
+        # a tagged message followed by a reply to it
+        if i % 2:
+            previous = telegram.Message(i, sender, datetime.now(), chat, text="about #Tag%d" % (i % tags))
+            yield previous
+        else:
+            yield telegram.Message(i, sender, datetime.now(), chat, text="a reply", reply_to_message=previous)
+
+
+def bench_feed(url, messages):
+    digester = Digester(url)
+    digester.get_config().add_chat(chat_id=1, name="bench", sendto="bench@hdbot.tech")
+    start = time.perf_counter()
+    for message in messages:
+        digester.feed(message)
+    return time.perf_counter() - start
+
+
+def bench_insert_many(url, count):
+    digester = Digester(url)
+    user = HashUser(id=1, friendly_name="User", username="user")
+    tag = HashTag(id="tag", shapes={"Tag"})
+    instances = []
+    for i in range(1, count+1):
+        message = HashMessage(id=i, date=datetime.now(), text="#Tag", chat_id=1)
+        message.tag = tag
+        message.user = user
+        instances.append(message)
+    start = time.perf_counter()
+    digester.db.insert_many(instances)
+    return time.perf_counter() - start
+
+
+def bench_digest(url, messages):
+    digester = Digester(url)
+    digester.get_config().add_chat(chat_id=1, name="bench", sendto="bench@hdbot.tech")
+    for message in messages:
+        digester.feed(message)
+    start = time.perf_counter()
+    for tag in digester.digest(1):
+        list(tag.messages)
+    return time.perf_counter() - start
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    messages = list(make_messages(count))
+
+    print("%-12s %12s %12s %12s" % ("backend", "feed", "insert_many", "digest"))
+    for name, url in URLS:
+        feed = bench_feed(url, messages)
+        insert_many = bench_insert_many(url, count)
+        digest = bench_digest(url, messages)
+        print("%-12s %10.0f/s %10.0f/s %10.3fs" % (name, count / feed, count / insert_many, digest))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""A local fake of the Telegram Bot API for load tests
+
+The server answers ``getUpdates`` from a scripted stream of messages produced
+at a fixed rate and records every ``sendMessage`` call.
+"""
+import collections
+import itertools
+import json
+import multiprocessing
+import threading
+import time
+from array import array
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+BOT_USER = {'id': 1, 'first_name': 'HDBot', 'username': 'hdbot'}
+API_METHODS = ('getMe', 'setWebhook', 'getChat', 'getUpdates', 'sendMessage')
+
+
+def script(count, chat_id=1, tags=50, users=20, noise=10, commands=1000):
+    """A chat where each tagged message is followed by a reply to it
+
+    Every `noise` messages one is neither tagged nor a reply, and every
+    `commands` messages one is a ``/start`` command.
+
+    Yields:
+        (dict, bool): The message and if it is expected to enter the digest
+    """
+    chat = {'id': chat_id, 'type': 'group', 'title': 'loadtest'}
+    senders = [{'id': i, 'first_name': 'User', 'last_name': str(i), 'username': 'user%d' % i}
+               for i in range(1, users+1)]
+    previous = None
+    for i in range(1, count+1):
+        message = {'message_id': i, 'from': senders[i % users], 'chat': chat, 'date': int(time.time())}
+        if i % commands == 0:
+            message['text'] = '/start'
+            yield message, False
+        elif i % noise == 0:
+            message['text'] = 'nothing to see here'
+            yield message, False
+        elif previous is None or i % 2:
+            message['text'] = 'talking about #Tag%d' % (i % tags)
+            previous = message
+            yield message, True
+        else:
+            message['text'] = 'a reply'
+            message['reply_to_message'] = previous
+            yield message, True
+
+
+class FakeBotAPI(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address=('127.0.0.1', 0)):
+        super().__init__(address, _Handler)
+        self.cond = threading.Condition()
+        self.updates = collections.deque()
+        self.next_update_id = 1
+        # message ids and the `time.time` they were available to the bot
+        self.produced_ids = array('q')
+        self.produced_times = array('d')
+        self.sent = []
+        self.closing = False
+        self.finished = threading.Event()
+        self.polling = threading.Event()
+        self._thread = None
+
+    @property
+    def base_url(self):
+        """Url to be given as ``base_url`` to `telegram.Bot`"""
+        host, port = self.server_address[:2]
+        return 'http://%s:%d/bot' % (host, port)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name='fakeapi', daemon=True)
+        self._thread.start()
+
+    def close(self):
+        with self.cond:
+            self.closing = True
+            self.cond.notify_all()
+        self.shutdown()
+        self.server_close()
+
+    def stream(self, messages, rate):
+        """Make `messages` available to ``getUpdates`` at `rate` messages per second
+
+        Runs in a new thread, `finished` is set when the stream is over.
+        """
+        def produce():
+            interval = 1.0 / rate
+            start = time.perf_counter()
+            for n, message in enumerate(messages):
+                delay = start + n*interval - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                self.push(message)
+                if self.closing:
+                    break
+            self.finished.set()
+
+        thread = threading.Thread(target=produce, name='fakeapi-stream', daemon=True)
+        thread.start()
+        return thread
+
+    def push(self, message):
+        with self.cond:
+            self.updates.append({'update_id': self.next_update_id, 'message': message})
+            self.next_update_id += 1
+            self.produced_ids.append(message['message_id'])
+            self.produced_times.append(time.time())
+            self.cond.notify_all()
+
+    def pending(self):
+        with self.cond:
+            return len(self.updates)
+
+    # Bot API methods
+
+    def getMe(self, **_):
+        return BOT_USER
+
+    def setWebhook(self, **_):
+        return True
+
+    def getChat(self, chat_id, **_):
+        return {'id': chat_id, 'type': 'group', 'title': 'loadtest'}
+
+    def getUpdates(self, offset=None, limit=100, timeout=0, **_):
+        # the bot cleans pending updates with short polling before it starts
+        if timeout:
+            self.polling.set()
+        deadline = time.perf_counter() + timeout
+        with self.cond:
+            # updates before the offset are confirmed
+            if offset:
+                while self.updates and self.updates[0]['update_id'] < offset:
+                    self.updates.popleft()
+            while not self.updates and not self.closing:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self.cond.wait(remaining)
+            return list(itertools.islice(self.updates, limit))
+
+    def sendMessage(self, chat_id, text, **kwargs):
+        with self.cond:
+            self.sent.append(dict(kwargs, chat_id=chat_id, text=text))
+        return {'message_id': len(self.sent), 'from': BOT_USER, 'date': int(time.time()),
+                'chat': {'id': int(chat_id), 'type': 'group'}, 'text': text}
+
+
+class FakeBotAPIProcess(multiprocessing.Process):
+    """Runs a `FakeBotAPI` in its own process
+
+    The server streams ``script(count, chat_id)`` at `rate` messages per second
+    once the bot starts polling. The script is generated lazily and the server
+    runs apart from the bot, so neither is accounted in the bot measurements.
+    """
+
+    def __init__(self, count, rate, chat_id=1):
+        super().__init__(name='fakeapi', daemon=True)
+        self.count = count
+        self.rate = rate
+        self.chat_id = chat_id
+
+        self.streaming = multiprocessing.Event()
+        self.finished = multiprocessing.Event()
+        self.produced = multiprocessing.Value('q', 0, lock=False)
+        self.pending = multiprocessing.Value('q', 0, lock=False)
+        self._closing = multiprocessing.Event()
+        self._conn, self._child_conn = multiprocessing.Pipe()
+        self._base_url = None
+
+    def run(self):
+        server = FakeBotAPI()
+        server.start()
+        self._child_conn.send(server.base_url)
+
+        server.polling.wait()
+        server.stream((message for message, _ in script(self.count, self.chat_id)), self.rate)
+        self.streaming.set()
+        while not self._closing.wait(0.1):
+            self.produced.value = len(server.produced_ids)
+            self.pending.value = server.pending()
+            if server.finished.is_set():
+                self.finished.set()
+
+        server.close()
+        self._child_conn.send((server.produced_ids, server.produced_times, len(server.sent)))
+
+    @property
+    def base_url(self):
+        """Url to be given as ``base_url`` to `telegram.Bot`, waiting the server to start"""
+        if self._base_url is None:
+            self._base_url = self._conn.recv()
+        return self._base_url
+
+    def stop(self):
+        """Stop the server
+
+        Returns:
+            tuple: The produced message ids, the `time.time` each one was
+            available to the bot and the number of messages sent by the bot
+        """
+        self._closing.set()
+        results = self._conn.recv()
+        self.join()
+        return results
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self._call({})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        self._call(json.loads(self.rfile.read(length).decode() or '{}'))
+
+    def _call(self, params):
+        # path is /bot<token>/<method>
+        name = self.path.rsplit('/', 1)[-1]
+        if name not in API_METHODS or not self.path.startswith('/bot'):
+            self._reply(404, {'ok': False, 'error_code': 404, 'description': 'Not Found'})
+        else:
+            self._reply(200, {'ok': True, 'result': getattr(self.server, name)(**params)})
+
+    def _reply(self, status, data):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""End-to-end load test of `HDBot` against a local fake Bot API
+
+Usage: python -m benchmarks.loadtest --rate 200 --count 20000
+
+Reports the ingest throughput, the lag from an update being available to its
+message committed in the database, and the memory of the bot process. The
+fake Bot API runs in another process, so it is not part of the measurements.
+"""
+import argparse
+import logging
+import os
+import resource
+import statistics
+import tempfile
+import time
+from array import array
+
+from hashdigestbot import hdbot
+from hashdigestbot.model import database
+
+from .fakeapi import FakeBotAPIProcess, script
+
+TOKEN = '123456:LOADTEST'
+CHAT_ID = 1
+
+
+def rss_mb():
+    """Resident memory of the process in MB"""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except OSError:
+        # peak memory, in KB on Linux but in bytes on MacOSX
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**10
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values)-1, int(len(values) * p / 100))]
+
+
+class Recorder:
+    """Wraps the database insert to record the `time.time` each message is committed
+
+    It takes 16 bytes per committed message of the bot process memory.
+    """
+
+    def __init__(self, db):
+        self.ids = array('q')
+        self.times = array('d')
+        self._insert = db.insert
+        db.insert = self.insert
+
+    def insert(self, instance):
+        self._insert(instance)
+        self.times.append(time.time())
+        self.ids.append(instance.id)
+
+    def __len__(self):
+        return len(self.ids)
+
+
+def run(rate, count, db_url, backend, interval, idle_timeout):
+    # start the server before the bot threads, as it may be a forked process
+    server = FakeBotAPIProcess(count, rate, CHAT_ID)
+    server.start()
+
+    bot = hdbot.HDBot(TOKEN, db_url, backend, base_url=server.base_url)
+    bot.get_config().add_chat(chat_id=CHAT_ID, name='loadtest', sendto='load@hdbot.tech')
+    recorder = Recorder(bot.digester.db)
+    bot.start()
+    expected = sum(1 for _, fed in script(count, CHAT_ID) if fed)
+    memory = [rss_mb()]
+    server.streaming.wait()
+
+    print("%8s %10s %10s %10s %10s" % ("time", "produced", "pending", "committed", "rss MB"))
+    start = time.perf_counter()
+    last_commit, last_count = start, 0
+    while len(recorder) < expected:
+        time.sleep(interval)
+        now = time.perf_counter()
+        memory.append(rss_mb())
+        print("%7.1fs %10d %10d %10d %10.1f" % (now - start, server.produced.value, server.pending.value,
+                                                len(recorder), memory[-1]))
+        if len(recorder) != last_count:
+            last_commit, last_count = now, len(recorder)
+        elif server.finished.is_set() and now - last_commit > idle_timeout:
+            print("No commits for %.0fs, giving up" % idle_timeout)
+            break
+
+    bot.stop()
+    produced_ids, produced_times, sent = server.stop()
+
+    produced = dict(zip(produced_ids, produced_times))
+    lags = [(committed - produced[id]) * 1000 for id, committed in zip(recorder.ids, recorder.times)]
+    print()
+    print("messages produced:    %d (%d expected in the digest)" % (len(produced), expected))
+    print("messages committed:   %d" % len(recorder))
+    print("messages sent:        %d" % sent)
+    if lags:
+        elapsed = recorder.times[-1] - produced_times[0]
+        print("ingest throughput:    %.1f msg/s" % (len(lags) / elapsed))
+        print("commit lag (ms):      mean %.1f, p50 %.1f, p95 %.1f, p99 %.1f, max %.1f" % (
+            statistics.mean(lags), percentile(lags, 50), percentile(lags, 95), percentile(lags, 99), max(lags)))
+    print("bot memory (MB):      start %.1f, end %.1f, max %.1f" % (memory[0], memory[-1], max(memory)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test of the Hashtag Digester Bot")
+    parser.add_argument('--rate', type=float, default=100, help='Messages per second (default: 100)')
+    parser.add_argument('--count', type=int, default=5000, help='Number of messages (default: 5000)')
+    parser.add_argument('--db', dest='db_url', help='Database url (default: a temporary sqlite file)')
+    parser.add_argument('--backend', choices=sorted(database.BACKENDS), help='Database backend')
+    parser.add_argument('--interval', type=float, default=1, help='Seconds between reports (default: 1)')
+    parser.add_argument('--idle-timeout', type=float, default=10,
+                        help='Seconds without commits before giving up (default: 10)')
+    args = parser.parse_args()
+
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+                        level=logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_url = args.db_url or 'sqlite:///' + os.path.join(tmpdir, 'loadtest.db')
+        run(args.rate, args.count, db_url, args.backend, args.interval, args.idle_timeout)
+
+
+if __name__ == "__main__":
+    main()
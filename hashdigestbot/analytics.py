@@ -0,0 +1,122 @@
+from array import array
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
+
+from .model.database import Database
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+EPOCH = datetime(1970, 1, 1)
+
+
+class MessageColumns:
+    """Columnar view of the digested messages for analytics
+
+    Only the columns needed by the analytics are loaded, in chunks, into
+    compact arrays instead of one ORM object per message. Tags are stored as
+    codes indexing `tag_ids`, and a message without reply has ``reply_to`` 0.
+
+    Aggregations use vectorized NumPy operations when it is installed and
+    plain Python otherwise.
+    """
+
+    def __init__(self):
+        self.ids = array('q')
+        self.dates = array('q')
+        self.tags = array('i')
+        self.users = array('q')
+        self.replies = array('q')
+        self.tag_ids = []
+        self._tag_codes = {}
+
+    @classmethod
+    def load(cls, db: Database, chat_id: int = None, chunk_size: int = 10000) -> 'MessageColumns':
+        """Load the messages of a chat, or of all chats if `chat_id` is not given
+
+        Messages are loaded ordered by id.
+        """
+        columns = cls()
+        for chunk in db.iter_message_columns(chat_id, chunk_size):
+            columns.extend(chunk)
+        return columns
+
+    def extend(self, rows):
+        """Append rows of ``(id, date, tag_id, user_id, reply_to)``"""
+        if not rows:
+            return
+        ids, dates, tags, users, replies = zip(*rows)
+        codes = self._tag_codes
+        for tag_id in tags:
+            if tag_id not in codes:
+                codes[tag_id] = len(self.tag_ids)
+                self.tag_ids.append(tag_id)
+
+        self.ids.extend(ids)
+        self.dates.extend(dates)
+        self.tags.extend(codes[tag_id] for tag_id in tags)
+        self.users.extend(users)
+        self.replies.extend(reply or 0 for reply in replies)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def tag_counts(self) -> Counter:
+        """Number of messages by tag id"""
+        if numpy:
+            counts = numpy.bincount(_view(self.tags), minlength=len(self.tag_ids)).tolist()
+        else:
+            counts = [0] * len(self.tag_ids)
+            for code, count in Counter(self.tags).items():
+                counts[code] = count
+        return Counter(dict(zip(self.tag_ids, counts)))
+
+    def user_activity(self) -> Counter:
+        """Number of messages by user id"""
+        if numpy:
+            users, counts = numpy.unique(_view(self.users), return_counts=True)
+            return Counter(dict(zip(users.tolist(), counts.tolist())))
+        return Counter(self.users)
+
+    def date_histogram(self, width: timedelta = timedelta(days=1)) -> List[Tuple[datetime, int]]:
+        """Number of messages by period of `width`, sorted by the period start
+
+        Periods are aligned to the epoch, so daily periods start at midnight.
+        Dates are stored in whole seconds, so `width` must be one second at least.
+        """
+        step = int(width.total_seconds())
+        if step < 1:
+            raise ValueError("Histogram width must be one second at least, got %s" % width)
+        if numpy:
+            buckets, counts = numpy.unique(_view(self.dates) // step, return_counts=True)
+            histogram = zip(buckets.tolist(), counts.tolist())
+        else:
+            histogram = sorted(Counter(date // step for date in self.dates).items())
+        return [(EPOCH + timedelta(seconds=bucket*step), count) for bucket, count in histogram]
+
+    def reply_tree(self) -> Dict[int, List[int]]:
+        """Replies of each replied message id, ordered by message id"""
+        if numpy:
+            replies = _view(self.replies)
+            is_reply = replies != 0
+            parents = replies[is_reply]
+            order = numpy.argsort(parents, kind='stable')
+            parents = parents[order]
+            children = _view(self.ids)[is_reply][order].tolist()
+            keys, starts = numpy.unique(parents, return_index=True)
+            bounds = starts.tolist() + [len(children)]
+            return {key: children[start:end] for key, start, end in zip(keys.tolist(), bounds, bounds[1:])}
+
+        tree = {}
+        for id, reply in zip(self.ids, self.replies):
+            if reply:
+                tree.setdefault(reply, []).append(id)
+        return tree
+
+
+# A zero-copy NumPy array over an `array.array`
+def _view(values: array):
+    return numpy.frombuffer(values, dtype=values.typecode)
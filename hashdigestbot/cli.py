@@ -7,6 +7,7 @@ import os
 from telegram import TelegramError
 
 from . import hdbot, util
+from .model import database
 
 ENVVAR_PREFIX = 'HDBOT'
 
@@ -69,21 +70,24 @@ class CLIError(Exception):
 
 class CLI:
     @staticmethod
-    def start(token, db_url):
+    def start(token, db_url, backend, profile, profile_window, profile_dir):
         """Initialize the bot"""
         try:
-            digestbot = hdbot.HDBot(token, db_url)
+            digestbot = hdbot.HDBot(token, db_url, backend)
         except Exception as e:
             raise CLIError(e)
         else:
+            bot_profiler = digestbot.setup_profiler(profile_dir, profile_window)
             digestbot.start()
+            if profile:
+                bot_profiler.start()
 
     @staticmethod
-    def config(token, db_url, op_name, values):
+    def config(token, db_url, backend, op_name, values):
         operation, name = op_name
 
         try:
-            digestbot = hdbot.HDBot(token, db_url)
+            digestbot = hdbot.HDBot(token, db_url, backend)
             cfg = digestbot.get_config()
             logging.info("Using configuration at %s", db_url)
         except Exception as e:
@@ -154,10 +158,18 @@ def main():
     common.add_argument('-t', '--token', required=True, help='Telegram bot token')
     common.add_argument('--db', dest='db_url', help='Database url for the digester',
                         default='sqlite:///' + os.path.join(app_dir, 'digester.db'))
+    common.add_argument('--backend', choices=sorted(database.BACKENDS),
+                        help='Database backend (default: sqlite3 for sqlite3:// urls, otherwise alchemy)')
 
     subparsers = parser.add_subparsers(dest='_command_')
 
     cmd_start = subparsers.add_parser("start", parents=[common], help="Initialize the bot")
+    cmd_start.add_argument('--profile', action='store_true',
+                           help='Profile the bot since its start. Send SIGUSR1 to toggle it at any time')
+    cmd_start.add_argument('--profile-window', type=float, default=60.0, metavar='SECONDS',
+                           help='Seconds to profile before writing the reports (default: 60)')
+    cmd_start.add_argument('--profile-dir', help='Directory of the profiling reports',
+                           default=os.path.join(app_dir, 'profiles'))
 
     cmd_config = subparsers.add_parser("config", parents=[common], help="Configure the bot")
     group = cmd_config.add_mutually_exclusive_group(required=True)
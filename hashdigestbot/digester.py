@@ -3,6 +3,7 @@ from typing import Iterator
 
 import telegram
 
+from .analytics import MessageColumns
 from .model.database import connect, Database
 from .model.entities import HashTag, HashMessage, HashUser, ConfigChat
 
@@ -32,8 +33,8 @@ class Config:
 
 
 class Digester:
-    def __init__(self, url: str, debug: bool = False):
-        self.db = connect(url, debug)
+    def __init__(self, url: str, debug: bool = False, backend: str = None):
+        self.db = connect(url, debug, backend)
         self.config = Config(self.db)
 
     def feed(self, message: telegram.Message) -> bool:
@@ -106,6 +107,14 @@ class Digester:
         """
         yield from self.db.get_tags_by_chat(chat_id)
 
+    def analytics(self, chat_id: int = None) -> MessageColumns:
+        """Columns of the digested messages to compute analytics
+
+        Args:
+            chat_id: The chat to analyse, all chats if not given
+        """
+        return MessageColumns.load(self.db, chat_id)
+
     def get_config(self):
         return self.config
 
@@ -1,16 +1,19 @@
 import logging
+import signal
 
 from telegram.ext import Updater, CommandHandler, MessageHandler, Filters
 
-from . import digester
+from . import digester, profiler
 
 LOG = logging.getLogger("hdbot")
 
 
 class HDBot:
-    def __init__(self, token, db_url):
-        # connect to Telegram with the desired token
-        self.updater = Updater(token=token)
+    def __init__(self, token, db_url, backend=None, base_url=None):
+        self.profiler = None
+
+        # connect to Telegram (or a compatible Bot API server) with the desired token
+        self.updater = Updater(token=token, base_url=base_url)
         self.bot = self.updater.bot
 
         # configure the bot behavior
@@ -20,7 +23,7 @@ class HDBot:
 
         # create a digester backed by the desired database
         try:
-            self.digester = digester.Digester(db_url)
+            self.digester = digester.Digester(db_url, backend=backend)
         except Exception as e:
             self.stop()
             raise e
@@ -54,7 +57,16 @@ class HDBot:
             LOG.debug("Bot username: %s", self.bot.getMe().name)
             LOG.debug("Digests database: %s", self.db_url)
 
+    def setup_profiler(self, directory, window=60.0):
+        """Allow to profile the bot, toggled by the SIGUSR1 signal where available"""
+        self.profiler = profiler.Profiler(self.updater.dispatcher, self.digester.db, directory, window)
+        if hasattr(signal, 'SIGUSR1'):
+            signal.signal(signal.SIGUSR1, self.profiler.signal_handler)
+        return self.profiler
+
     def stop(self):
+        if self.profiler:
+            self.profiler.stop()
         self.updater.stop()
 
     # suitable to be used by `contextlib.closing`
@@ -1,18 +1,83 @@
-from typing import Iterable
+import calendar
+import itertools
+import logging
+import sqlite3
+from typing import Iterable, Iterator, List, Tuple
 
 from sqlalchemy import create_engine
+from sqlalchemy.dialects.sqlite.pysqlite import SQLiteDialect_pysqlite
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.exc import InvalidRequestError
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm.interfaces import MANYTOONE
+from sqlalchemy.schema import CreateTable
 
 from .entities import Base, HashTag, HashMessage
 
+LOG = logging.getLogger("hdbot.database")
+
 
 class Database:
-    def __init__(self):
+    """Storage backend interface used by the digester"""
+
+    def connect(self, url):
+        raise NotImplementedError
+
+    def is_connected(self):
+        raise NotImplementedError
+
+    def get_message_tag(self, message_id: int) -> HashTag:
+        """Tag related to a message"""
+        raise NotImplementedError
+
+    def get_messages_by_tag(self, tag_id: str) -> Iterable[HashMessage]:
+        """Sequence of messages related to a tag"""
+        raise NotImplementedError
+
+    def get_tags_by_chat(self, chat_id) -> Iterable[HashTag]:
+        raise NotImplementedError
+
+    def iter_message_columns(self, chat_id=None, chunk_size=10000) -> Iterator[List[Tuple]]:
+        """Columns of the messages ordered by id, in chunks of `chunk_size` rows
+
+        Every row is a tuple ``(id, date, tag_id, user_id, reply_to)`` with the
+        date in seconds since the epoch, as stored, without time zone handling.
+        """
+        raise NotImplementedError
+
+    def insert(self, instance):
+        raise NotImplementedError
+
+    def insert_many(self, instances):
+        raise NotImplementedError
+
+    def upsert(self, instance):
+        raise NotImplementedError
+
+    def get(self, entity, **kwargs):
+        raise NotImplementedError
+
+    def exists(self, entity, **kwargs):
+        raise NotImplementedError
+
+    @staticmethod
+    def generate_tag_id(tag: str) -> str:
+        """Generate a key for a tag"""
+        return tag.lower()
+
+
+class AlchemyDatabase(Database):
+    """Backend using the SQLAlchemy ORM, suitable for any supported database"""
+
+    def __init__(self, debug: bool = False):
         self.session = None
+        self.debug = debug
 
-    def connect(self, engine):
+    def connect(self, url):
         if self.session:
             raise RuntimeError("Database already connected")
+        engine = create_engine(url, echo=self.debug)
+        Base.metadata.create_all(engine)
         self.session = sessionmaker(bind=engine)(autocommit=True)
 
     def is_connected(self):
@@ -23,14 +88,12 @@ class Database:
         return self.session.query
 
     def get_message_tag(self, message_id: int) -> HashTag:
-        """Tag related to a message"""
         tag = self.query(HashTag).\
             join(HashMessage).\
-            filter_by(id=message_id).one()
+            filter_by(id=message_id).one_or_none()
         return tag
 
     def get_messages_by_tag(self, tag_id: str) -> Iterable[HashMessage]:
-        """Sequence of messages related to a tag"""
         messages = self.query(HashMessage).\
             filter_by(tag_id=tag_id)
         return messages
@@ -41,10 +104,28 @@ class Database:
             filter_by(chat_id=chat_id)
         return tags
 
+    def iter_message_columns(self, chat_id=None, chunk_size=10000) -> Iterator[List[Tuple]]:
+        q = self.query(HashMessage.id, HashMessage.date, HashMessage.tag_id,
+                       HashMessage.user_id, HashMessage.reply_to)
+        if chat_id is not None:
+            q = q.filter_by(chat_id=chat_id)
+        q = q.order_by(HashMessage.id)
+        rows = ((id, calendar.timegm(date.timetuple()), tag_id, user_id, reply_to)
+                for id, date, tag_id, user_id, reply_to in q.yield_per(chunk_size))
+        while True:
+            chunk = list(itertools.islice(rows, chunk_size))
+            if not chunk:
+                break
+            yield chunk
+
     def insert(self, instance):
         with self.session.begin():
             self.session.add(instance)
 
+    def insert_many(self, instances):
+        with self.session.begin():
+            self.session.add_all(instances)
+
     def upsert(self, instance):
         with self.session.begin():
             self.session.merge(instance)
@@ -57,15 +138,249 @@ class Database:
         q = self.query(entity).filter_by(**kwargs)
         return self.query(q.exists()).scalar()
 
+
+# Per-entity SQL and value converters for `SQLite3Database`.
+class _Mapping:
+    # SQLAlchemy types are only used to convert values, so the database file
+    # keeps the same format whatever backend is used to write it.
+    dialect = SQLiteDialect_pysqlite()
+
+    def __init__(self, entity):
+        mapper = entity.__mapper__
+        table = entity.__table__
+
+        self.entity = entity
+        self.table = table.name
+        self.keys = []
+        self.columns = []
+        self.primary_key = []
+        self.defaults = {}
+        self.bind_processors = []
+        self.result_processors = []
+        for prop in mapper.column_attrs:
+            column = prop.columns[0]
+            impl = column.type.dialect_impl(self.dialect)
+            if column.primary_key:
+                self.primary_key.append(len(self.keys))
+            self.keys.append(prop.key)
+            self.columns.append(column.name)
+            self.bind_processors.append(impl.bind_processor(self.dialect))
+            self.result_processors.append(impl.result_processor(self.dialect, None))
+            if column.default is not None and column.default.is_scalar:
+                self.defaults[prop.key] = column.default.arg
+
+        # many-to-one relationships are saved together with the instance
+        self.parents = []
+        for rel in mapper.relationships:
+            if rel.direction is MANYTOONE:
+                pairs = [(self._key(mapper, local), self._key(rel.mapper, remote))
+                         for local, remote in rel.local_remote_pairs]
+                self.parents.append((rel.key, pairs))
+
+        columns = ', '.join(self.columns)
+        params = ', '.join('?' * len(self.columns))
+        self.select_sql = 'SELECT %s FROM %s' % (columns, self.table)
+        self.insert_sql = 'INSERT INTO %s (%s) VALUES (%s)' % (self.table, columns, params)
+        self.replace_sql = 'INSERT OR REPLACE INTO %s (%s) VALUES (%s)' % (self.table, columns, params)
+
     @staticmethod
-    def generate_tag_id(tag: str) -> str:
-        """Generate a key for a tag"""
-        return tag.lower()
+    def _key(mapper, column):
+        return mapper.get_property_by_column(column).key
+
+    def where(self, keys):
+        """WHERE clause matching the attributes `keys`, empty without keys"""
+        if not keys:
+            return ''
+        conditions = []
+        for key in keys:
+            if key not in self.keys:
+                # the same error of `Query.filter_by`
+                raise InvalidRequestError("Entity '%s' has no property '%s'" % (self.entity, key))
+            conditions.append('%s = ?' % self.columns[self.keys.index(key)])
+        return ' WHERE ' + ' AND '.join(conditions)
+
+    def params(self, instance):
+        values = []
+        for key, process in zip(self.keys, self.bind_processors):
+            value = getattr(instance, key)
+            if value is None:
+                value = self.defaults.get(key)
+            values.append(process(value) if process else value)
+        return values
+
+    def make(self, row):
+        values = {}
+        for key, process, value in zip(self.keys, self.result_processors, row):
+            values[key] = process(value) if process else value
+        return self.entity(**values)
+
+
+class SQLite3Database(Database):
+    """Lightweight backend issuing raw SQL through the stdlib `sqlite3` module
+
+    Skips the ORM unit of work, which makes it cheaper on the ingest path.
+    Instances are returned detached, so changes on them are only saved by a
+    new `insert` or `upsert`.
+    """
+
+    def __init__(self, debug: bool = False):
+        self.connection = None
+        self.debug = debug
+        self._mappings = {}
+        self._queries = {}
+
+    def connect(self, url):
+        if self.connection:
+            raise RuntimeError("Database already connected")
+        url = make_url(url)
+        if not _is_sqlite(url):
+            raise ValueError("The sqlite3 backend does not support the url '%s'" % url)
+        database = url.database or ':memory:'
+        self.connection = sqlite3.connect(database, check_same_thread=False)
+        if self.debug:
+            self.connection.set_trace_callback(LOG.info)
+        self._create_tables()
+
+    def is_connected(self):
+        return bool(self.connection)
+
+    def _create_tables(self):
+        existing = {name for name, in self.connection.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table'")}
+        with self.connection:
+            for table in Base.metadata.sorted_tables:
+                if table.name not in existing:
+                    self.connection.execute(str(CreateTable(table).compile(dialect=_Mapping.dialect)))
+
+    def _mapping(self, entity) -> _Mapping:
+        mapping = self._mappings.get(entity)
+        if mapping is None:
+            mapping = self._mappings[entity] = _Mapping(entity)
+        return mapping
+
+    def _select(self, entity, keys, suffix=''):
+        query_key = (entity, keys, suffix)
+        sql = self._queries.get(query_key)
+        if sql is None:
+            mapping = self._mapping(entity)
+            sql = self._queries[query_key] = mapping.select_sql + mapping.where(keys) + suffix
+        return sql
+
+    def get_message_tag(self, message_id: int) -> HashTag:
+        row = self.connection.execute(
+            'SELECT tag_id FROM messages WHERE id = ?', (message_id,)).fetchone()
+        return row and self.get(HashTag, id=row[0])
+
+    def get_messages_by_tag(self, tag_id: str) -> Iterable[HashMessage]:
+        mapping = self._mapping(HashMessage)
+        cursor = self.connection.execute(self._select(HashMessage, ('tag_id',)), (tag_id,))
+        return [mapping.make(row) for row in cursor]
+
+    def get_tags_by_chat(self, chat_id) -> Iterable[HashTag]:
+        mapping = self._mapping(HashTag)
+        cursor = self.connection.execute(
+            'SELECT DISTINCT tags.%s FROM tags JOIN messages ON messages.tag_id = tags.id '
+            'WHERE messages.chat_id = ?' % ', tags.'.join(mapping.columns), (chat_id,))
+        tags = [mapping.make(row) for row in cursor.fetchall()]
+        for tag in tags:
+            tag.messages = self.get_messages_by_tag(tag.id)
+        return tags
+
+    def iter_message_columns(self, chat_id=None, chunk_size=10000) -> Iterator[List[Tuple]]:
+        sql = "SELECT id, CAST(strftime('%s', date) AS INTEGER), tag_id, user_id, reply_to FROM messages"
+        if chat_id is None:
+            cursor = self.connection.execute(sql + ' ORDER BY id')
+        else:
+            cursor = self.connection.execute(sql + ' WHERE chat_id = ? ORDER BY id', (chat_id,))
+        chunk = cursor.fetchmany(chunk_size)
+        while chunk:
+            yield chunk
+            chunk = cursor.fetchmany(chunk_size)
+
+    def _save_parents(self, mapping, instances):
+        # rows of each parent entity by primary key, so a parent shared by
+        # several instances is written once
+        rows = {}
+        seen = set()
+        for key, pairs in mapping.parents:
+            for instance in instances:
+                parent = getattr(instance, key)
+                if parent is None:
+                    continue
+                if id(parent) not in seen:
+                    seen.add(id(parent))
+                    parent_mapping = self._mapping(type(parent))
+                    params = parent_mapping.params(parent)
+                    primary_key = tuple(params[i] for i in parent_mapping.primary_key)
+                    rows.setdefault(parent_mapping, {})[primary_key] = params
+                for local, remote in pairs:
+                    setattr(instance, local, getattr(parent, remote))
+        for parent_mapping, parent_rows in rows.items():
+            self.connection.executemany(parent_mapping.replace_sql, parent_rows.values())
+
+    def insert(self, instance):
+        mapping = self._mapping(type(instance))
+        with self.connection:
+            self._save_parents(mapping, [instance])
+            self.connection.execute(mapping.insert_sql, mapping.params(instance))
+
+    def insert_many(self, instances):
+        # instances may be of several entities, each one is written by a single `executemany`
+        groups = {}
+        for instance in instances:
+            groups.setdefault(type(instance), []).append(instance)
+        with self.connection:
+            for entity, group in groups.items():
+                mapping = self._mapping(entity)
+                self._save_parents(mapping, group)
+                self.connection.executemany(mapping.insert_sql, [mapping.params(i) for i in group])
+
+    def upsert(self, instance):
+        mapping = self._mapping(type(instance))
+        with self.connection:
+            self._save_parents(mapping, [instance])
+            self.connection.execute(mapping.replace_sql, mapping.params(instance))
+
+    def get(self, entity, **kwargs):
+        keys = tuple(kwargs)
+        row = self.connection.execute(self._select(entity, keys), tuple(kwargs.values())).fetchone()
+        return row and self._mapping(entity).make(row)
+
+    def exists(self, entity, **kwargs):
+        keys = tuple(kwargs)
+        mapping = self._mapping(entity)
+        query_key = (entity, keys, 'exists')
+        sql = self._queries.get(query_key)
+        if sql is None:
+            sql = self._queries[query_key] = 'SELECT 1 FROM %s%s LIMIT 1' % (mapping.table, mapping.where(keys))
+        return self.connection.execute(sql, tuple(kwargs.values())).fetchone() is not None
+
+
+def _is_sqlite(url) -> bool:
+    return url.drivername.split('+')[0] in ('sqlite', 'sqlite3')
+
+
+BACKENDS = {
+    'alchemy': AlchemyDatabase,
+    'sqlite3': SQLite3Database,
+}
+
 
+def connect(url: str, debug: bool = False, backend: str = None) -> Database:
+    """Connect to the database at `url`
 
-def connect(url: str, debug: bool = False) -> Database:
-    db = Database()
-    engine = create_engine(url, echo=debug)
-    Base.metadata.create_all(engine)
-    db.connect(engine)
+    When `backend` is not given, urls as ``sqlite3:///path/to/file.db`` select
+    the `SQLite3Database` backend and any other url the `AlchemyDatabase`.
+    """
+    parsed_url = make_url(url)
+    if backend is None:
+        backend = 'sqlite3' if parsed_url.drivername == 'sqlite3' else 'alchemy'
+    if backend not in BACKENDS:
+        raise ValueError("Unknown database backend '%s'" % backend)
+    if backend == 'sqlite3' and not _is_sqlite(parsed_url):
+        raise ValueError("The sqlite3 backend does not support the url '%s'" % parsed_url)
+    if backend == 'alchemy' and parsed_url.drivername == 'sqlite3':
+        raise ValueError("The url '%s' is only supported by the sqlite3 backend" % parsed_url)
+    db = BACKENDS[backend](debug)
+    db.connect(url)
     return db
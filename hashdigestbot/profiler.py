@@ -0,0 +1,201 @@
+import cProfile
+import collections
+import functools
+import logging
+import os
+import sys
+import threading
+import time
+
+LOG = logging.getLogger("hdbot.profiler")
+
+# Database methods timed while profiling. Generators such as
+# `iter_message_columns` are left out, their call only creates the generator.
+DB_METHODS = (
+    'get_message_tag',
+    'get_messages_by_tag',
+    'get_tags_by_chat',
+    'insert',
+    'insert_many',
+    'upsert',
+    'get',
+    'exists',
+    'generate_tag_id',
+)
+
+
+class _Session:
+    """State of a profiling window"""
+
+    def __init__(self):
+        self.timings = {'handler': {}, 'database': {}}
+        self.stacks = collections.Counter()
+        self.cprofile = cProfile.Profile()
+        self.started = time.time()
+        self.stopped = threading.Event()
+        self.callbacks = []
+        self.sampler = None
+        self.timer = None
+
+
+class Profiler:
+    """Profile a running bot during a time window
+
+    While active, handler callbacks and database methods are replaced by timed
+    wrappers, handlers run under `cProfile` and a thread samples the stacks of
+    the whole process. Nothing is installed when inactive, so the bot runs with
+    no overhead.
+
+    When the window ends, it writes to `directory`:
+
+    - ``profile-<time>.txt``: timing tables by handler and database method
+    - ``profile-<time>.pstats``: `cProfile` stats of the handlers
+    - ``profile-<time>.collapsed``: sampled stacks in the collapsed format
+      used by flame graph tools
+    """
+
+    def __init__(self, dispatcher, db, directory, window=60.0, interval=0.005):
+        self.dispatcher = dispatcher
+        self.db = db
+        self.directory = directory
+        self.window = window
+        self.interval = interval
+
+        self._lock = threading.Lock()
+        self._cprofile_lock = threading.Lock()
+        self._session = None
+
+    def is_active(self):
+        return self._session is not None
+
+    def start(self, window=None):
+        """Start profiling, stopping after `window` seconds"""
+        with self._lock:
+            if self._session:
+                raise RuntimeError("Profiler already active")
+            session = self._session = _Session()
+
+            # time the handlers
+            for handlers in self.dispatcher.handlers.values():
+                for handler in handlers:
+                    session.callbacks.append((handler, handler.callback))
+                    handler.callback = self._wrap(session, 'handler', handler.callback, profile=True)
+            # time the database, an instance attribute hides the method
+            for name in DB_METHODS:
+                setattr(self.db, name, self._wrap(session, 'database', getattr(self.db, name)))
+
+            session.sampler = threading.Thread(target=self._sample, args=(session,), name='profiler', daemon=True)
+            session.sampler.start()
+            session.timer = threading.Timer(window or self.window, self.stop, args=(session,))
+            session.timer.daemon = True
+            session.timer.start()
+        LOG.info("Profiling for %.0f seconds", window or self.window)
+
+    def stop(self, session=None):
+        """Stop profiling and write the reports
+
+        Args:
+            session: Only stop if this is still the current session
+
+        Returns:
+            list: Paths of the written files
+        """
+        # take the session under the lock, a new one may start right after
+        with self._lock:
+            if self._session is None or session not in (None, self._session):
+                return []
+            session, self._session = self._session, None
+            session.timer.cancel()
+            session.stopped.set()
+            for handler, callback in session.callbacks:
+                handler.callback = callback
+            for name in DB_METHODS:
+                delattr(self.db, name)
+        session.sampler.join()
+        # wait a handler still running under cProfile
+        with self._cprofile_lock:
+            paths = self._dump(session)
+        LOG.info("Profile written to %s", ', '.join(paths))
+        return paths
+
+    def toggle(self):
+        if self._session:
+            self.stop()
+        else:
+            self.start()
+
+    # suitable to be used as a `signal` handler
+    def signal_handler(self, signum, frame):
+        # reports are written outside of the signal handler
+        threading.Thread(target=self.toggle, name='profiler-toggle').start()
+
+    def _wrap(self, session, kind, func, profile=False):
+        timings = session.timings[kind]
+        cprofile = session.cprofile
+        name = getattr(func, '__name__', repr(func))
+
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            # cProfile can only follow one thread at a time
+            profiling = profile and self._cprofile_lock.acquire(blocking=False)
+            if profiling:
+                cprofile.enable()
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                if profiling:
+                    cprofile.disable()
+                    self._cprofile_lock.release()
+                stat = timings.get(name)
+                if stat is None:
+                    stat = timings.setdefault(name, [0, 0.0, 0.0])
+                stat[0] += 1
+                stat[1] += elapsed
+                stat[2] = max(stat[2], elapsed)
+        return timed
+
+    def _sample(self, session):
+        me = threading.get_ident()
+        while not session.stopped.is_set():
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    filename = os.path.basename(code.co_filename).replace(' ', '_')
+                    stack.append('%s:%s' % (filename, code.co_name))
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)).replace(' ', '_'))
+                session.stacks[';'.join(reversed(stack))] += 1
+            session.stopped.wait(self.interval)
+
+    def _dump(self, session):
+        os.makedirs(self.directory, exist_ok=True)
+        prefix = base = os.path.join(self.directory,
+                                     time.strftime('profile-%Y%m%d-%H%M%S', time.localtime(session.started)))
+        # windows started in the same second
+        n = 1
+        while os.path.exists(prefix + '.txt'):
+            n += 1
+            prefix = '%s-%d' % (base, n)
+        elapsed = time.time() - session.started
+
+        with open(prefix + '.txt', 'w') as report:
+            report.write("Profiled for %.1f seconds\n" % elapsed)
+            for kind, timings in sorted(session.timings.items(), reverse=True):
+                report.write("\n%-30s %10s %12s %12s %12s\n" % (kind, 'calls', 'total (ms)', 'mean (ms)', 'max (ms)'))
+                for name, (calls, total, longest) in sorted(timings.items(), key=lambda t: -t[1][1]):
+                    report.write("%-30s %10d %12.3f %12.3f %12.3f\n" % (
+                        name, calls, total * 1000, total / calls * 1000, longest * 1000))
+
+        session.cprofile.dump_stats(prefix + '.pstats')
+
+        with open(prefix + '.collapsed', 'w') as collapsed:
+            for stack, count in session.stacks.items():
+                collapsed.write('%s %d\n' % (stack, count))
+
+        return [prefix + ext for ext in ('.txt', '.pstats', '.collapsed')]
@@ -19,7 +19,7 @@ setup(
     author="Wagner Macedo",
     author_email='wagnerluis1982@gmail.com',
     url='https://github.com/wagnerluis1982/HashDigestBot',
-    packages=find_packages(exclude=['tests']),
+    packages=find_packages(exclude=['tests', 'benchmarks']),
     entry_points={
         'console_scripts': [
             'hdbot=hashdigestbot.cli:main',
@@ -27,6 +27,9 @@ setup(
     },
     include_package_data=True,
     install_requires=requirements,
+    extras_require={
+        'analytics': ['numpy'],
+    },
     license="GNU General Public License v3",
     keywords='hashdigestbot',
     classifiers=[
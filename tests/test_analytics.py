@@ -0,0 +1,88 @@
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+from hashdigestbot import analytics
+from hashdigestbot.digester import Digester
+
+from .test_digester import MockMessage
+
+
+class TestMessageColumns(unittest.TestCase):
+    db_url = "sqlite://"
+
+    def setUp(self):
+        self.digester = Digester(self.db_url)
+        config = self.digester.get_config()
+        config.add_chat(chat_id=1, name="knight", sendto="bruce@wayne.tech")
+        config.add_chat(chat_id=2, name="island", sendto="oliver@queen.ind")
+
+        flow = (
+            MockMessage(1938, "Did you see #Superman?", 1),
+            MockMessage(1939, "I am an useless message", 1),
+            MockMessage(1940, "Yes, I saw", 1, reply_id=1938),
+            MockMessage(1941, "#IronMaiden rules", 2),
+            MockMessage(1942, "Me too", 1, reply_id=1938),
+            MockMessage(1943, "Yeahhhh!!!", 2, reply_id=1941),
+            MockMessage(1944, "And #superman", 1),
+            MockMessage(1945, "Not again", 1, reply_id=1940),
+        )
+        for msg, day in zip(flow, (1, 1, 1, 2, 2, 2, 3, 3)):
+            msg.date = datetime(2016, 7, day, 12, msg.message_id % 60)
+            self.digester.feed(msg)
+
+    def check_columns(self):
+        columns = self.digester.analytics(1)
+        self.assertEqual(len(columns), 5)
+        self.assertEqual(columns.tag_counts(), {"superman": 5})
+        self.assertEqual(columns.user_activity(), {1: 5})
+        self.assertEqual(columns.date_histogram(), [
+            (datetime(2016, 7, 1), 2),
+            (datetime(2016, 7, 2), 1),
+            (datetime(2016, 7, 3), 2),
+        ])
+        self.assertEqual(columns.date_histogram(timedelta(days=7)), [(datetime(2016, 6, 30), 5)])
+        for width in (timedelta(milliseconds=500), timedelta(0), timedelta(days=-1)):
+            with self.assertRaises(ValueError):
+                columns.date_histogram(width)
+        self.assertEqual(columns.reply_tree(), {1938: [1940, 1942], 1940: [1945]})
+
+        columns = self.digester.analytics()
+        self.assertEqual(len(columns), 7)
+        self.assertEqual(columns.tag_counts(), {"superman": 5, "ironmaiden": 2})
+        self.assertEqual(columns.reply_tree(), {1938: [1940, 1942], 1940: [1945], 1941: [1943]})
+
+    def test_columns(self):
+        self.check_columns()
+
+    def test_columns_without_numpy(self):
+        with mock.patch.object(analytics, 'numpy', None):
+            self.check_columns()
+
+    def test_reply_tree_order(self):
+        # a reply stored after messages with greater ids
+        msg = MockMessage(1937, "First!", 1, reply_id=1938)
+        msg.date = datetime(2016, 7, 4)
+        self.digester.feed(msg)
+
+        expected = {1938: [1937, 1940, 1942], 1940: [1945]}
+        self.assertEqual(self.digester.analytics(1).reply_tree(), expected)
+        with mock.patch.object(analytics, 'numpy', None):
+            self.assertEqual(self.digester.analytics(1).reply_tree(), expected)
+
+    def test_load_in_chunks(self):
+        columns = analytics.MessageColumns.load(self.digester.db, chunk_size=2)
+        self.assertEqual(list(columns.ids), [1938, 1940, 1941, 1942, 1943, 1944, 1945])
+        self.assertEqual(columns.tag_ids, ["superman", "ironmaiden"])
+
+    def test_empty(self):
+        columns = self.digester.analytics(3)
+        self.assertEqual(len(columns), 0)
+        self.assertEqual(columns.tag_counts(), {})
+        self.assertEqual(columns.user_activity(), {})
+        self.assertEqual(columns.date_histogram(), [])
+        self.assertEqual(columns.reply_tree(), {})
+
+
+class TestMessageColumnsSQLite3(TestMessageColumns):
+    db_url = "sqlite3://"
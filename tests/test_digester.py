@@ -2,8 +2,10 @@ import unittest
 from datetime import datetime
 
 import telegram
+from sqlalchemy.exc import InvalidRequestError
 
 from hashdigestbot.digester import extract_hashtag, Digester
+from hashdigestbot.model.entities import ConfigChat, HashMessage, HashTag, HashUser
 
 
 # A helper class made on top of `telegram.Message`
@@ -34,8 +36,10 @@ class MockMessage(telegram.Message):
 
 
 class TestDigester(unittest.TestCase):
+    db_url = "sqlite://"
+
     def setUp(self):
-        self.digester = Digester("sqlite://")
+        self.digester = Digester(self.db_url)
 
     # set the flow as a lambda because SQLAlchemy keeps track of instances
     flow = (
@@ -105,6 +109,36 @@ class TestDigester(unittest.TestCase):
         with self.assertRaises(StopIteration):
             next(digest)
 
+    def test_insert_many(self):
+        tag = HashTag(id="superman", shapes={"Superman"})
+        user = HashUser(id=1, friendly_name="He Man", username="heman")
+        messages = [HashMessage(id=i, date=datetime.now(), text="#Superman", chat_id=1) for i in range(3)]
+        for message in messages:
+            message.tag = tag
+            message.user = user
+
+        # several entities in the same batch
+        chat = ConfigChat(chat_id=1, name="gotham", sendto="bruce@wayne.tech")
+        self.digester.db.insert_many(messages + [chat])
+
+        self.assertEqual(sorted(m.id for m in self.digester.db.get_messages_by_tag("superman")), [0, 1, 2])
+        self.assertEqual(self.digester.db.get(HashUser, id=1).username, "heman")
+        self.assertTrue(self.digester.db.exists(ConfigChat, chat_id=1))
+
+    def test_get_and_exists(self):
+        db = self.digester.db
+        self.assertIsNone(db.get(ConfigChat))
+        self.assertFalse(db.exists(ConfigChat))
+
+        db.upsert(ConfigChat(chat_id=1, name="gotham", sendto="bruce@wayne.tech"))
+        self.assertEqual(db.get(ConfigChat).name, "gotham")
+        self.assertTrue(db.exists(ConfigChat))
+
+        with self.assertRaisesRegex(InvalidRequestError, "no property 'unknown'"):
+            db.get(ConfigChat, unknown=1)
+        with self.assertRaisesRegex(InvalidRequestError, "no property 'unknown'"):
+            db.exists(ConfigChat, unknown=1)
+
     def test_extract_hashtag(self):
         # one tag
         self.assertEqual(extract_hashtag("I #love GDG"), "love")
@@ -127,3 +161,16 @@ class TestDigester(unittest.TestCase):
 
         # no subtags
         self.assertEqual(extract_hashtag("#dont#like #sub#tags"), None)
+
+
+# The same tests against the lightweight sqlite3 backend
+class TestDigesterSQLite3(TestDigester):
+    db_url = "sqlite3://"
+
+    def test_backend_url(self):
+        with self.assertRaises(ValueError):
+            Digester("postgresql://bot@host/hdbot", backend="sqlite3")
+        with self.assertRaises(ValueError):
+            Digester("sqlite3://", backend="alchemy")
+        with self.assertRaises(ValueError):
+            Digester("sqlite://", backend="unknown")
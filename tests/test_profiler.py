@@ -0,0 +1,68 @@
+import pstats
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+from telegram.ext import MessageHandler, Filters
+
+from hashdigestbot.digester import Digester
+from hashdigestbot.model.entities import ConfigChat
+from hashdigestbot.profiler import Profiler
+
+
+class TestProfiler(unittest.TestCase):
+    def setUp(self):
+        self.digester = Digester("sqlite3://")
+        self.handler = MessageHandler([Filters.text], self.on_message)
+        dispatcher = SimpleNamespace(handlers={0: [self.handler]})
+
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.profiler = Profiler(dispatcher, self.digester.db, tmpdir.name)
+
+    def on_message(self, bot, update):
+        return self.digester.db.exists(ConfigChat, chat_id=1)
+
+    def test_profile(self):
+        callback = self.handler.callback
+
+        self.profiler.start()
+        self.assertTrue(self.profiler.is_active())
+        self.assertIsNot(self.handler.callback, callback)
+        self.assertIn('exists', vars(self.digester.db))
+        self.assertNotIn('iter_message_columns', vars(self.digester.db))
+        self.assertFalse(self.handler.callback(None, None))
+        txt, stats, collapsed = self.profiler.stop()
+
+        # everything is restored
+        self.assertFalse(self.profiler.is_active())
+        self.assertEqual(self.handler.callback, callback)
+        self.assertNotIn('exists', vars(self.digester.db))
+
+        with open(txt) as report:
+            content = report.read()
+        self.assertRegex(content, r"\non_message +1 ")
+        self.assertRegex(content, r"\nexists +1 ")
+        self.assertTrue(pstats.Stats(stats).total_calls)
+        with open(collapsed) as stacks:
+            self.assertRegex(stacks.readline(), r"^\S+ \d+$")
+
+    def test_stale_stop(self):
+        # e.g. the timer of a window ending while a new window starts
+        self.profiler.start()
+        first = self.profiler._session
+        first_paths = self.profiler.stop()
+
+        self.profiler.start()
+        self.assertEqual(self.profiler.stop(first), [])
+        self.assertTrue(self.profiler.is_active())
+        self.handler.callback(None, None)
+        second_paths = self.profiler.stop()
+        self.assertFalse(self.profiler.is_active())
+        self.assertNotEqual(first_paths, second_paths)
+
+        with open(second_paths[0]) as report:
+            self.assertRegex(report.read(), r"\non_message +1 ")
+
+    def test_stop_inactive(self):
+        self.assertEqual(self.profiler.stop(), [])